@@ -4,11 +4,50 @@ A beautiful chatbot interface that connects to your LangChain MCP server
 """
 
 import streamlit as st
-import requests
-import json
-from datetime import datetime
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+import httpx
+import asyncio
+import threading
+import queue
+from concurrent.futures import Future, ThreadPoolExecutor
+import itertools
+from collections import deque
+import logging
+import orjson
+import re
+import secrets
+from pathlib import Path
 import time
 
+# Client-side batching window for JSON-RPC batch requests
+BATCH_MS = 100
+BATCH_MAX_SIZE = 16
+
+# How often an in-flight reply (and its server status) is checked on, in seconds
+POLL_INTERVAL = 0.2
+
+# Stateless tools whose replies can be reused for identical arguments
+CACHEABLE_TOOLS = {"chat"}
+CACHED_REPLY_TTL = 60
+
+# Session history limits
+MAX_MESSAGES = 500
+MAX_DEBUG_LOGS = 200
+DEBUG_LOGS_SHOWN = 20
+
+# Where chat history is saved between reconnects
+SESSIONS_DIR = Path.home() / ".fuse" / "sessions"
+_SESSION_ID_RE = re.compile(r"session-[A-Za-z0-9_-]{22}")
+
+# Default model for each LLM provider
+_DEFAULT_MODELS = {
+    "openai": "gpt-3.5-turbo",
+    "anthropic": "claude-3-sonnet-20240229"
+}
+
+logger = logging.getLogger(__name__)
+
+
 # Page configuration
 st.set_page_config(
     page_title="Fuse Chatbot",
@@ -18,37 +57,14 @@ st.set_page_config(
 )
 
 # Custom CSS for better styling
-st.markdown("""
+@st.cache_resource
+def _css_once():
+    """Static stylesheet, built once per process so every rerun sends an identical element"""
+    return """
 <style>
     .stApp {
         background-image: linear-gradient(135deg, #f8f9fa 0%, #e2e6ea 100%);
     }
-    .chat-message {
-        padding: 1.5rem;
-        border-radius: 0.5rem;
-        margin-bottom: 1rem;
-        display: flex;
-        flex-direction: column;
-    }
-    .user-message {
-        background-color: #e2e6ea;
-        color: #222;
-        margin-left: 20%;
-    }
-    .assistant-message {
-        background-color: #f8f9fa;
-        color: #222;
-        margin-right: 20%;
-    }
-    .error-message {
-        background-color: #c53030;
-        color: white;
-    }
-    .message-time {
-        font-size: 0.75rem;
-        opacity: 0.7;
-        margin-top: 0.5rem;
-    }
     .stButton>button {
         width: 100%;
         background-color: #e2e6ea;
@@ -74,110 +90,550 @@ st.markdown("""
         color: white;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+st.markdown(_css_once(), unsafe_allow_html=True)
+
+# Chat history persistence
+class SessionStore:
+    """Saves each session's messages as a JSON file so they survive reconnects.
+    
+    Disk errors are logged and otherwise ignored, so history falls back to
+    living in memory only.
+    """
+    
+    def __init__(self, directory):
+        self._directory = directory
+        self._lock = threading.Lock()
+        try:
+            self._directory.mkdir(parents=True, exist_ok=True)
+        except OSError as e:
+            logger.warning("Chat history won't be saved: %s", e)
+            self._directory = None
+    
+    def _path(self, session_id):
+        return self._directory / f"{session_id}.json"
+    
+    def load(self, session_id):
+        """Saved messages for a session, or None if there are none"""
+        if self._directory is None:
+            return None
+        try:
+            messages = orjson.loads(self._path(session_id).read_bytes())
+        except FileNotFoundError:
+            return None
+        except (OSError, orjson.JSONDecodeError) as e:
+            logger.warning("Couldn't load chat history for %s: %s", session_id, e)
+            return None
+        
+        if not isinstance(messages, list) or not all(
+            isinstance(message, dict) and {'role', 'content', 'timestamp'} <= message.keys()
+            for message in messages
+        ):
+            logger.warning("Ignoring malformed chat history for %s", session_id)
+            return None
+        return messages
+    
+    def save(self, session_id, messages):
+        """Write the messages to disk, replacing the file atomically.
+        
+        Returns False if they couldn't be written.
+        """
+        if self._directory is None:
+            return False
+        data = orjson.dumps(list(messages))
+        path = self._path(session_id)
+        tmp_path = path.with_suffix('.tmp')
+        with self._lock:
+            try:
+                tmp_path.write_bytes(data)
+                tmp_path.replace(path)
+            except OSError as e:
+                logger.warning("Couldn't save chat history for %s: %s", session_id, e)
+                return False
+        return True
+
+@st.cache_resource
+def get_session_store():
+    """Process-wide session store"""
+    return SessionStore(SESSIONS_DIR)
+
+def new_session_id():
+    """Start a new session id and remember it in the page URL"""
+    # Unguessable, since the id in the URL is all it takes to open the saved chat
+    session_id = f"session-{secrets.token_urlsafe(16)}"
+    st.query_params['session'] = session_id
+    return session_id
 
 # Initialize session state
-if 'messages' not in st.session_state:
-    st.session_state.messages = []
 if 'session_id' not in st.session_state:
-    st.session_state.session_id = f"session-{int(time.time() * 1000)}"
+    # Reuse the id from the URL so a reconnect picks up the saved history
+    session_id = st.query_params.get('session', '')
+    if _SESSION_ID_RE.fullmatch(session_id):
+        st.session_state.session_id = session_id
+    else:
+        st.session_state.session_id = new_session_id()
+if 'messages' not in st.session_state:
+    saved = get_session_store().load(st.session_state.session_id) or []
+    st.session_state.messages = deque(saved, maxlen=MAX_MESSAGES)
 if 'connection_status' not in st.session_state:
     st.session_state.connection_status = 'unknown'
 if 'debug_logs' not in st.session_state:
-    st.session_state.debug_logs = []
+    st.session_state.debug_logs = deque(maxlen=MAX_DEBUG_LOGS)
+if 'pending' not in st.session_state:
+    st.session_state.pending = []
 
 # Helper functions
+@st.cache_resource
+def get_thread_pool():
+    """Worker threads for MCP calls that have to block, like cached ones.
+    
+    Each worker just waits on the network, so there are plenty of them.
+    """
+    return ThreadPoolExecutor(max_workers=64)
+
+def submit_in_background(fn, *args, **kwargs):
+    """Run fn on the thread pool with this session's script context attached"""
+    ctx = get_script_run_ctx()
+    
+    def run():
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return fn(*args, **kwargs)
+    
+    return get_thread_pool().submit(run)
+
 def add_debug_log(message, log_type='info'):
-    """Add a debug log entry"""
-    timestamp = datetime.now().strftime('%H:%M:%S')
+    """Add a debug log entry (timestamped only while debug logs are shown)"""
+    logger.debug("[%s] %s", log_type.upper(), message)
     st.session_state.debug_logs.append({
-        'time': timestamp,
+        'time': time.strftime('%H:%M:%S') if st.session_state.get('show_debug') else None,
         'type': log_type,
         'message': message
     })
-    print(f"[{log_type.upper()}] {message}")
 
-def call_mcp_tool(server_url, tool_name, arguments):
-    """Call an MCP tool on the server"""
-    try:
-        request_body = {
-            "jsonrpc": "2.0",
-            "id": int(time.time() * 1000),
-            "method": "tools/call",
-            "params": {
-                "name": tool_name,
-                "arguments": arguments
-            }
+def save_history():
+    """Save this session's messages, keeping them in memory only if that fails"""
+    if not get_session_store().save(st.session_state.session_id, st.session_state.messages):
+        add_debug_log("Couldn't save chat history; it will be lost on reconnect", 'error')
+
+@st.cache_resource(show_spinner=False)
+def get_event_loop():
+    """Background event loop that runs all async MCP requests"""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return loop
+
+@st.cache_resource(show_spinner=False)
+def get_async_client():
+    """Shared async HTTP client, only ever used on the background loop"""
+    return httpx.AsyncClient(
+        http2=True,
+        timeout=30,
+        limits=httpx.Limits(max_keepalive_connections=8, keepalive_expiry=300),
+        headers={
+            'Content-Type': 'application/json',
+            'Accept': 'application/json, text/event-stream'
+        }
+    )
+
+@st.cache_resource(show_spinner=False)
+def _request_ids():
+    """JSON-RPC request id counter shared by every session and rerun.
+    
+    Streamlit re-executes this module on each run, so a plain module-level
+    counter would start again at 1 every time.
+    """
+    return itertools.count(1)
+
+def _tool_request(tool_name, arguments):
+    """Build a JSON-RPC tools/call request"""
+    return {
+        "jsonrpc": "2.0",
+        "id": next(_request_ids()),
+        "method": "tools/call",
+        "params": {
+            "name": tool_name,
+            "arguments": arguments
         }
+    }
+
+async def _iter_sse_messages(response):
+    """Yield the JSON payload of each event in a text/event-stream response"""
+    data_lines = []
+    async for line in response.aiter_lines():
+        if line.startswith('data:'):
+            value = line[5:]
+            data_lines.append(value[1:] if value.startswith(' ') else value)
+        elif not line and data_lines:
+            yield orjson.loads('\n'.join(data_lines))
+            data_lines = []
+    if data_lines:
+        yield orjson.loads('\n'.join(data_lines))
+
+async def _call(client, server_url, request_body, progress=None, timeout=httpx.USE_CLIENT_DEFAULT):
+    """Send a JSON-RPC request (or batch) and collect the replies.
+    
+    Accepts both plain JSON and MCP streamable-HTTP (SSE) responses. Server
+    notifications in a stream are put on the progress queue as they arrive.
+    Returns (status_code, replies) where replies is a list of JSON-RPC
+    response objects.
+    """
+    async with client.stream(
+        'POST',
+        server_url,
+        content=orjson.dumps(request_body),
+        timeout=timeout
+    ) as response:
+        if response.headers.get('content-type', '').startswith('text/event-stream'):
+            replies = []
+            async for message in _iter_sse_messages(response):
+                if isinstance(message, list):
+                    replies.extend(message)
+                elif not isinstance(message, dict):
+                    replies.append(message)
+                elif 'id' in message and ('result' in message or 'error' in message):
+                    replies.append(message)
+                elif progress is not None:
+                    progress.put(message)
+            return response.status_code, replies
         
+        data = orjson.loads(await response.aread())
+        return response.status_code, data if isinstance(data, list) else [data]
+
+async def _warm_up(client, server_url):
+    """Open a connection to the server ahead of the first tool call"""
+    try:
+        await client.head(server_url)
+    except httpx.HTTPError:
+        pass
+
+def warm_up_connection(server_url):
+    """Fire-and-forget connection warm-up on the background loop"""
+    asyncio.run_coroutine_threadsafe(_warm_up(get_async_client(), server_url), get_event_loop())
+
+def _notification_status(message):
+    """Status line for a server log or progress notification, if any.
+    
+    These report what the server is doing; they are never part of the reply.
+    """
+    params = message.get('params')
+    if not isinstance(params, dict):
+        return ''
+    if message.get('method') == 'notifications/message':
+        data = params.get('data')
+        if not isinstance(data, str):
+            data = orjson.dumps(data).decode()
+        return f"{params.get('level', 'info')}: {data}"
+    if message.get('method') == 'notifications/progress':
+        status = params.get('message')
+        return status if isinstance(status, str) else ''
+    return ''
+
+def _latest_status(progress, status=''):
+    """Drain a progress queue, returning the newest status line seen"""
+    while True:
+        try:
+            status = _notification_status(progress.get_nowait()) or status
+        except queue.Empty:
+            return status
+
+def _wait_for_response(future):
+    """Block until an in-flight request finishes, returning its result or exception"""
+    try:
+        return future.result()
+    except Exception as e:
+        return e
+
+def _parse_tool_response(response):
+    """Turn a JSON-RPC reply or transport exception into (ok, result or error message)"""
+    if isinstance(response, httpx.TimeoutException):
+        return False, "Request timed out. The server took too long to respond."
+    if isinstance(response, httpx.ConnectError):
+        return False, "Connection failed. Check your server URL."
+    if isinstance(response, BaseException):
+        return False, f"Error: {str(response)}"
+    
+    if st.session_state.get('show_debug'):
+        add_debug_log(f"Response: {orjson.dumps(response).decode()}", 'info')
+    
+    if not isinstance(response, dict):
+        return False, "Error: Unexpected response format"
+    if 'error' in response:
+        if not isinstance(response['error'], dict):
+            return False, "Error: Unexpected response format"
+        return False, f"Error: {response['error'].get('message', str(response['error']))}"
+    if not isinstance(response.get('result'), dict):
+        return False, "Error: Unexpected response format"
+    
+    return True, response['result']
+
+def _tool_result(response):
+    """(ok, result or error message) for the outcome of a single _call"""
+    if not isinstance(response, BaseException):
+        status_code, replies = response
+        add_debug_log(f"Response status: {status_code}", 'info')
+        if not replies:
+            return False, "Error: Empty response from server"
+        response = replies[0]
+    return _parse_tool_response(response)
+
+def _tool_results(responses, count):
+    """(ok, result or error message) for each of count calls sent together"""
+    if isinstance(responses, BaseException):
+        responses = [responses] * count
+    return [_tool_result(response) for response in responses]
+
+def send_mcp_tools(server_url, calls, progress=None):
+    """Start several MCP tool calls concurrently without waiting for them.
+    
+    Takes a list of (tool_name, arguments) pairs and returns a
+    concurrent.futures.Future for their raw responses; pass its outcome to
+    _tool_results. Server notifications from any of the calls are put on
+    the progress queue.
+    """
+    request_bodies = []
+    for tool_name, arguments in calls:
+        request_body = _tool_request(tool_name, arguments)
         add_debug_log(f"Calling tool: {tool_name}", 'info')
-        add_debug_log(f"Request: {json.dumps(request_body, indent=2)}", 'info')
-        
-        response = requests.post(
-            server_url,
-            json=request_body,
-            headers={'Content-Type': 'application/json'},
-            timeout=30
+        if st.session_state.get('show_debug'):
+            add_debug_log(f"Request: {orjson.dumps(request_body).decode()}", 'info')
+        request_bodies.append(request_body)
+    
+    client = get_async_client()
+    
+    async def gather():
+        return await asyncio.gather(
+            *[_call(client, server_url, body, progress) for body in request_bodies],
+            return_exceptions=True
         )
+    
+    return asyncio.run_coroutine_threadsafe(gather(), get_event_loop())
+
+def call_mcp_tools_batch(server_url, calls, progress=None):
+    """Call several MCP tools concurrently.
+    
+    Takes a list of (tool_name, arguments) pairs and returns one
+    (ok, result or error message) tuple per call, in order. Server
+    notifications from any of the calls are put on the progress queue.
+    """
+    future = send_mcp_tools(server_url, calls, progress)
+    return _tool_results(_wait_for_response(future), len(calls))
+
+class BatchQueue:
+    """Coalesces tool calls from all sessions into JSON-RPC batch requests.
+    
+    A worker thread collects queued calls for up to BATCH_MS (or
+    BATCH_MAX_SIZE calls), posts one batch per server URL and hands each
+    reply back to its caller by JSON-RPC id.
+    """
+    
+    def __init__(self, client, loop):
+        self._client = client
+        self._loop = loop
+        self._queue = queue.Queue()
+        threading.Thread(target=self._run, daemon=True).start()
+    
+    def enqueue(self, server_url, tool_name, arguments):
+        """Queue a tool call without waiting for it.
         
-        add_debug_log(f"Response status: {response.status_code}", 'info')
-        add_debug_log(f"Response: {response.text}", 'info')
+        Returns a concurrent.futures.Future for its JSON-RPC reply; pass the
+        outcome to _parse_tool_response.
+        """
+        request_body = _tool_request(tool_name, arguments)
+        add_debug_log(f"Queueing tool: {tool_name}", 'info')
+        if st.session_state.get('show_debug'):
+            add_debug_log(f"Request: {orjson.dumps(request_body).decode()}", 'info')
         
-        data = response.json()
+        future = Future()
+        self._queue.put((server_url, request_body, future))
+        return future
+    
+    def submit(self, server_url, tool_name, arguments):
+        """Queue a tool call and block until its batch has been answered.
         
-        if 'error' in data:
-            raise Exception(data['error'].get('message', str(data['error'])))
+        Returns (ok, result or error message), like call_mcp_tool.
+        """
+        future = self.enqueue(server_url, tool_name, arguments)
+        return _parse_tool_response(_wait_for_response(future))
+    
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            deadline = time.monotonic() + BATCH_MS / 1000
+            while len(items) < BATCH_MAX_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    items.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            
+            groups = {}
+            for server_url, request_body, future in items:
+                groups.setdefault(server_url, []).append((request_body, future))
+            
+            for server_url, group in groups.items():
+                batch = [request_body for request_body, _ in group]
+                future = asyncio.run_coroutine_threadsafe(
+                    _call(self._client, server_url, batch), self._loop
+                )
+                future.add_done_callback(lambda f, group=group: self._resolve(f, group))
+    
+    def _resolve(self, future, group):
+        fallback = Exception("No reply for this request in the batch response")
+        try:
+            _, replies = future.result()
+            replies = {reply.get('id'): reply for reply in replies if isinstance(reply, dict)}
+            # A single reply with a null id means the batch was rejected as a whole
+            fallback = replies.get(None, fallback)
+        except Exception as e:
+            replies = {}
+            fallback = e
         
-        return data['result']
+        for request_body, reply_future in group:
+            reply_future.set_result(replies.get(request_body['id'], fallback))
+
+@st.cache_resource(show_spinner=False)
+def get_batch_queue():
+    """Process-wide batch queue shared by every session"""
+    return BatchQueue(get_async_client(), get_event_loop())
+
+def _call_mcp_tool_uncached(server_url, tool_name, arguments, batched=False, progress=None):
+    """Send a tool call to the server; returns (ok, result or error message)"""
+    if batched:
+        return get_batch_queue().submit(server_url, tool_name, arguments)
     
-    except requests.exceptions.Timeout:
-        raise Exception("Request timed out. The server took too long to respond.")
-    except requests.exceptions.ConnectionError:
-        raise Exception("Connection failed. Check your server URL.")
-    except Exception as e:
-        raise Exception(f"Error: {str(e)}")
+    return call_mcp_tools_batch(server_url, [(tool_name, arguments)], progress)[0]
 
-def test_connection(server_url):
-    """Test connection to MCP server"""
+class _FailedCall(Exception):
+    """Carries a failed call's error message out of the cache without caching it"""
+
+@st.cache_data(ttl=CACHED_REPLY_TTL, show_spinner=False)
+def _call_mcp_tool_cached(server_url, tool_name, args_key, batched, _progress=None):
+    """Tool result for a stateless call, reused for identical arguments.
+    
+    args_key is the arguments as sorted-key JSON, so equal arguments share a
+    cache entry. Failures are raised rather than returned so they are not
+    cached.
+    """
+    ok, result = _call_mcp_tool_uncached(
+        server_url, tool_name, orjson.loads(args_key), batched, _progress
+    )
+    if not ok:
+        raise _FailedCall(result)
+    return result
+
+def call_mcp_tool(server_url, tool_name, arguments, batched=False, progress=None):
+    """Call an MCP tool on the server.
+    
+    Returns (ok, result) on success or (False, error message) on failure.
+    If the server streams its reply, its log and progress notifications are
+    put on the progress queue. Batched calls are never streamed. Replies from
+    CACHEABLE_TOOLS are reused for CACHED_REPLY_TTL seconds; tools with
+    server-side state, like conversation_with_memory, always hit the server.
+    """
+    if tool_name not in CACHEABLE_TOOLS:
+        return _call_mcp_tool_uncached(server_url, tool_name, arguments, batched, progress)
+    
+    args_key = orjson.dumps(arguments, option=orjson.OPT_SORT_KEYS).decode()
+    try:
+        return True, _call_mcp_tool_cached(server_url, tool_name, args_key, batched, progress)
+    except _FailedCall as e:
+        return False, str(e)
+
+def _background_result(outcome):
+    """(ok, result or error message) for a call_mcp_tool run on the thread pool"""
+    if isinstance(outcome, BaseException):
+        return False, f"Error: {str(outcome)}"
+    return outcome
+
+def start_mcp_tool(server_url, tool_name, arguments, batched=False, progress=None):
+    """Start an MCP tool call and return straight away.
+    
+    Returns (future, parse): a concurrent.futures.Future for the call, and a
+    function that turns its result (or exception) into (ok, result or error
+    message). Call parse from the script thread so its debug logging lands
+    in the session. Only CACHEABLE_TOOLS take up a worker thread, since the
+    reply cache can only be consulted by a blocking call; other calls are
+    just requests in flight on the event loop.
+    """
+    if tool_name in CACHEABLE_TOOLS:
+        future = submit_in_background(
+            call_mcp_tool, server_url, tool_name, arguments, batched, progress
+        )
+        return future, _background_result
+    
+    if batched:
+        return get_batch_queue().enqueue(server_url, tool_name, arguments), _parse_tool_response
+    
+    future = send_mcp_tools(server_url, [(tool_name, arguments)], progress)
+    return future, lambda responses: _tool_results(responses, 1)[0]
+
+def _test_connection_uncached(server_url):
+    """Send an initialize request; returns (success, message)"""
     try:
-        add_debug_log(f"Testing connection to: {server_url}", 'info')
-        
         request_body = {
             "jsonrpc": "2.0",
-            "id": 1,
+            "id": next(_request_ids()),
             "method": "initialize",
             "params": {}
         }
         
-        response = requests.post(
-            server_url,
-            json=request_body,
-            headers={'Content-Type': 'application/json'},
-            timeout=10
+        future = asyncio.run_coroutine_threadsafe(
+            _call(get_async_client(), server_url, request_body, timeout=10),
+            get_event_loop()
         )
+        _, replies = future.result()
+        if not replies:
+            return False, "Empty response from server"
         
-        add_debug_log(f"Response status: {response.status_code}", 'info')
-        data = response.json()
+        data = replies[0]
         
         if 'error' in data:
-            add_debug_log(f"Server error: {json.dumps(data['error'])}", 'error')
             return False, f"Server error: {data['error'].get('message', 'Unknown error')}"
         
         if 'result' in data:
             server_name = data['result'].get('serverInfo', {}).get('name', 'Unknown')
-            add_debug_log(f"✓ Connection successful! Server: {server_name}", 'success')
             return True, f"Connected to {server_name}"
         
         return False, "Unexpected response format"
     
     except Exception as e:
-        add_debug_log(f"Connection failed: {str(e)}", 'error')
+        return False, str(e)
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _test_connection_cached(server_url):
+    """Success message for a reachable server, cached per URL for 30 seconds.
+    
+    Failures are raised rather than returned so they are not cached.
+    """
+    success, message = _test_connection_uncached(server_url)
+    if not success:
+        raise _FailedCall(message)
+    return message
+
+def test_connection(server_url):
+    """Test connection to MCP server.
+    
+    Successful results are cached per URL for 30 seconds; debug logging is
+    left to the caller since cached calls don't replay side effects.
+    """
+    try:
+        return True, _test_connection_cached(server_url)
+    except _FailedCall as e:
         return False, str(e)
 
 # Sidebar configuration
-with st.sidebar:
-    st.title("⚙️ Settings")
+@st.fragment
+def settings_panel():
+    """Server, LLM and session settings.
     
+    Runs as a fragment so changing a setting reruns only this panel, and the
+    POLL_INTERVAL polls for pending replies don't rebuild it either. Sending
+    a chat message is still a full rerun; the chat reads the chosen values
+    back from session state.
+    """
     # Server configuration
     st.subheader("MCP Server")
     server_url = st.text_input(
@@ -188,14 +644,27 @@ with st.sidebar:
     )
     st.session_state.server_url = server_url
     
-    if st.button("🔌 Test Connection"):
+    test_clicked = st.button("🔌 Test Connection")
+    retest_clicked = st.button(
+        "♻️ Force Re-test",
+        help="Ignore the cached result from the last 30 seconds"
+    )
+    if retest_clicked:
+        _test_connection_cached.clear()
+    
+    if test_clicked or retest_clicked:
         if server_url:
             with st.spinner("Testing connection..."):
+                add_debug_log(f"Testing connection to: {server_url}", 'info')
                 success, message = test_connection(server_url)
                 if success:
+                    add_debug_log(f"✓ {message}", 'success')
+                    # The result may have come from cache without touching the network
+                    warm_up_connection(server_url)
                     st.session_state.connection_status = 'connected'
                     st.success(message)
                 else:
+                    add_debug_log(f"Connection failed: {message}", 'error')
                     st.session_state.connection_status = 'error'
                     st.error(message)
         else:
@@ -213,27 +682,39 @@ with st.sidebar:
         st.markdown('<div class="connection-status status-unknown">⚬ Not Tested</div>', 
                    unsafe_allow_html=True)
     
+    batch_requests = st.checkbox(
+        "Batch Requests",
+        value=False,
+        help="Coalesce tool calls from all sessions into JSON-RPC batches. "
+             "Leave off for single-user use; it adds up to "
+             f"{BATCH_MS} ms per message."
+    )
+    st.session_state.batch_requests = batch_requests
+    
     st.divider()
     
     # LLM configuration
     st.subheader("LLM Settings")
     provider = st.selectbox(
         "Provider",
-        ["openai", "anthropic"],
+        list(_DEFAULT_MODELS),
         help="Choose your LLM provider"
     )
+    st.session_state.provider = provider
     
     model = st.text_input(
         "Model",
-        value="gpt-3.5-turbo" if provider == "openai" else "claude-3-sonnet-20240229",
+        value=_DEFAULT_MODELS[provider],
         help="Specific model to use"
     )
+    st.session_state.model = model
     
     use_memory = st.checkbox(
         "Use Conversation Memory",
         value=True,
         help="Remember previous messages in the conversation"
     )
+    st.session_state.use_memory = use_memory
     
     st.divider()
     
@@ -243,129 +724,217 @@ with st.sidebar:
     st.text(f"Messages: {len(st.session_state.messages)}")
     
     if st.button("🗑️ Clear Chat"):
-        st.session_state.messages = []
+        st.session_state.messages.clear()
+        st.session_state.pending.clear()
+        save_history()
         st.rerun()
     
     if st.button("🔄 New Session"):
-        st.session_state.messages = []
-        st.session_state.session_id = f"session-{int(time.time() * 1000)}"
+        st.session_state.messages.clear()
+        # Replies still in flight belong to the old session
+        st.session_state.pending.clear()
+        st.session_state.session_id = new_session_id()
         st.rerun()
+
+with st.sidebar:
+    st.title("⚙️ Settings")
+    settings_panel()
     
     st.divider()
     
-    # Debug toggle
-    show_debug = st.checkbox("Show Debug Logs", value=False)
+    # Debug toggle, outside the fragment so it also shows/hides the debug panel
+    st.checkbox("Show Debug Logs", value=False, key='show_debug')
 
 # Main chat interface
 st.title("🤖 Fuse Chatbot")
 
 # Display chat messages
-chat_container = st.container()
-with chat_container:
+def render_message(message):
+    """Draw a single chat bubble"""
+    is_error = message.get('is_error', False)
+    if message['role'] == 'user':
+        avatar = "👤"
+    else:
+        avatar = "❌" if is_error else "🤖"
+    
+    with st.chat_message(message['role'], avatar=avatar):
+        if is_error:
+            st.error(message['content'])
+        else:
+            st.markdown(message['content'])
+        st.caption(message['timestamp'])
+
+def render_chat():
+    """Draw the conversation so far.
+    
+    Returns the welcome placeholder so it can be cleared once the first
+    message is sent.
+    """
+    welcome_slot = st.empty()
     if len(st.session_state.messages) == 0:
-        st.info("""
+        welcome_slot.info("""
         👋 Welcome to the Fuse Chatbot!
         """)
     
     for message in st.session_state.messages:
-        role = message['role']
-        content = message['content']
-        timestamp = message['timestamp']
-        is_error = message.get('is_error', False)
-        
-        if role == 'user':
-            st.markdown(f"""
-            <div class="chat-message user-message">
-                <div><strong>👤 You</strong></div>
-                <div>{content}</div>
-                <div class="message-time">{timestamp}</div>
-            </div>
-            """, unsafe_allow_html=True)
-        else:
-            css_class = "error-message" if is_error else "assistant-message"
-            icon = "❌" if is_error else "🤖"
-            st.markdown(f"""
-            <div class="chat-message {css_class}">
-                <div><strong>{icon} Assistant</strong></div>
-                <div>{content}</div>
-                <div class="message-time">{timestamp}</div>
-            </div>
-            """, unsafe_allow_html=True)
-
-# Chat input
-user_input = st.chat_input("Type your message here...")
+        render_message(message)
+    
+    return welcome_slot
 
-if user_input:
-    if not server_url:
-        st.error("⚠️ Please configure your MCP Server URL in the sidebar first!")
-    else:
-        # Add user message
-        timestamp = datetime.now().strftime('%I:%M %p')
-        st.session_state.messages.append({
-            'role': 'user',
-            'content': user_input,
-            'timestamp': timestamp
-        })
-        
-        # Get bot response
-        with st.spinner("🤔 Thinking..."):
+def _reply_message(ok, result):
+    """Assistant message for the (ok, result) outcome of a tool call"""
+    timestamp = time.strftime('%I:%M %p')
+    if ok:
+        # Extract response: the first text item in the tool's content
+        content = result.get('content')
+        texts = [
+            item['text'] for item in (content if isinstance(content, list) else [])
+            if isinstance(item, dict) and isinstance(item.get('text'), str)
+        ]
+        if not texts:
+            return _reply_message(False, "Error: Unexpected response format")
+        return {
+            'role': 'assistant',
+            'content': texts[0],
+            'timestamp': timestamp,
+            'is_error': False
+        }
+    
+    return {
+        'role': 'assistant',
+        'content': f"Error: {result}\n\nPlease check your server URL and API keys.",
+        'timestamp': timestamp,
+        'is_error': True
+    }
+
+@st.fragment(run_every=POLL_INTERVAL)
+def pending_replies():
+    """Show in-flight replies and move finished ones into the chat log.
+    
+    Reruns on its own every POLL_INTERVAL while replies are pending, showing
+    the server's latest status notification under each one; once any reply
+    is in, the whole app reruns so it is drawn as part of the log and
+    polling stops.
+    """
+    finished = False
+    for pending in list(st.session_state.pending):
+        future = pending['future']
+        if future.done():
+            # Always retire the entry, or this fragment would fail on every poll
+            st.session_state.pending.remove(pending)
             try:
-                # Choose tool based on memory setting
-                if use_memory:
-                    tool_name = "conversation_with_memory"
-                    arguments = {
-                        "message": user_input,
-                        "sessionId": st.session_state.session_id,
-                        "provider": provider
-                    }
-                else:
-                    tool_name = "chat"
-                    arguments = {
-                        "message": user_input,
-                        "provider": provider,
-                        "model": model
-                    }
-                
-                # Call MCP tool
-                result = call_mcp_tool(server_url, tool_name, arguments)
-                
-                # Extract response
-                response_text = result['content'][0]['text']
-                
-                # Add assistant message
-                st.session_state.messages.append({
-                    'role': 'assistant',
-                    'content': response_text,
-                    'timestamp': datetime.now().strftime('%I:%M %p'),
-                    'is_error': False
-                })
-                
+                reply = _reply_message(*pending['parse'](_wait_for_response(future)))
             except Exception as e:
-                # Add error message
-                st.session_state.messages.append({
-                    'role': 'assistant',
-                    'content': f"Error: {str(e)}\n\nPlease check your server URL and API keys.",
-                    'timestamp': datetime.now().strftime('%I:%M %p'),
-                    'is_error': True
-                })
-        
-        # Rerun to display new messages
+                reply = _reply_message(False, f"Error: {str(e)}")
+            st.session_state.messages.append(reply)
+            finished = True
+        else:
+            pending['status'] = _latest_status(pending['progress'], pending['status'])
+            with st.chat_message('assistant', avatar="🤖"):
+                st.markdown("🤔 Thinking...")
+                if pending['status']:
+                    st.caption(pending['status'])
+    
+    if finished:
+        save_history()
         st.rerun()
-
-# Debug logs (if enabled)
-if show_debug and len(st.session_state.debug_logs) > 0:
-    st.divider()
-    st.subheader("🐛 Debug Logs")
     
-    if st.button("Clear Debug Logs"):
-        st.session_state.debug_logs = []
+    if st.session_state.pending and st.button("✋ Stop waiting"):
+        # Running calls can't be interrupted; their replies are just dropped
+        st.session_state.pending.clear()
         st.rerun()
+
+def chat_panel(user_input):
+    """Chat log, handling of a newly sent message, and debug logs.
+    
+    Tool calls are started without waiting and their replies are drawn by
+    pending_replies, so the input stays usable while the server is thinking.
+    """
+    server_url = st.session_state.server_url
+    provider = st.session_state.provider
+    model = st.session_state.model
+    use_memory = st.session_state.use_memory
+    batch_requests = st.session_state.batch_requests
+    show_debug = st.session_state.show_debug
     
-    for log in st.session_state.debug_logs[-20:]:  # Show last 20 logs
-        log_color = {
-            'error': '🔴',
-            'success': '🟢',
-            'info': '🔵'
-        }.get(log['type'], '⚪')
+    chat_container = st.container()
+    with chat_container:
+        welcome_slot = render_chat()
+    
+    if user_input:
+        if not server_url:
+            st.error("⚠️ Please configure your MCP Server URL in the sidebar first!")
+        else:
+            # Add user message and show it right away
+            timestamp = time.strftime('%I:%M %p')
+            user_message = {
+                'role': 'user',
+                'content': user_input,
+                'timestamp': timestamp
+            }
+            st.session_state.messages.append(user_message)
+            save_history()
+            welcome_slot.empty()
+            with chat_container:
+                render_message(user_message)
+            
+            # Choose tool based on memory setting
+            if use_memory:
+                tool_name = "conversation_with_memory"
+                arguments = {
+                    "message": user_input,
+                    "sessionId": st.session_state.session_id,
+                    "provider": provider
+                }
+            else:
+                tool_name = "chat"
+                arguments = {
+                    "message": user_input,
+                    "provider": provider,
+                    "model": model
+                }
+            
+            # Start the MCP tool call; server notifications arrive on the queue
+            progress = queue.Queue()
+            future, parse = start_mcp_tool(
+                server_url,
+                tool_name,
+                arguments,
+                batched=batch_requests,
+                progress=progress
+            )
+            st.session_state.pending.append({
+                'future': future,
+                'parse': parse,
+                'progress': progress,
+                'status': ''
+            })
+    
+    if st.session_state.pending:
+        with chat_container:
+            pending_replies()
+    
+    # Debug logs (if enabled)
+    if show_debug and len(st.session_state.debug_logs) > 0:
+        st.divider()
+        st.subheader("🐛 Debug Logs")
         
-        st.text(f"{log_color} [{log['time']}] {log['message']}")
\ No newline at end of file
+        if st.button("Clear Debug Logs"):
+            st.session_state.debug_logs.clear()
+            st.rerun()
+        
+        # Copy first: background tool calls may be appending to the log
+        for log in deque(st.session_state.debug_logs, maxlen=DEBUG_LOGS_SHOWN):
+            log_color = {
+                'error': '🔴',
+                'success': '🟢',
+                'info': '🔵'
+            }.get(log['type'], '⚪')
+            
+            timestamp = f"[{log['time']}] " if log['time'] else ""
+            st.text(f"{log_color} {timestamp}{log['message']}")
+
+# Chat input, called at the top level so it stays pinned to the bottom
+user_input = st.chat_input("Type your message here...")
+
+chat_panel(user_input)